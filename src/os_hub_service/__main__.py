@@ -1,5 +1,7 @@
-import asyncio
-from server import main
+if __package__:
+    from .server import run
+else:  # Run as a script, e.g. `python src/os_hub_service`
+    from server import run
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run()
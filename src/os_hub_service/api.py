@@ -1,4 +1,6 @@
 import os
+from contextlib import asynccontextmanager
+
 import httpx
 from dotenv import load_dotenv
 
@@ -10,10 +12,42 @@ BASE_URL = "https://staging.opensupplyhub.org/api"
 if not API_KEY:
     raise ValueError("Open_Supply_Hub_API_KEY is not set in the environment.")
 
+# Shared client, created on first use so it binds to the running event loop
+_client: httpx.AsyncClient | None = None
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers={"Accept-Encoding": "gzip", "Authorization": f"Token {API_KEY}"},
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            http2=True,
+            timeout=httpx.Timeout(10.0),
+        )
+    return _client
+
+async def aclose():
+    """Close the shared HTTP client."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+@asynccontextmanager
+async def lifespan():
+    """Keep the shared HTTP client open for the block and close it on exit.
+
+    Hosts calling fetch_facilities should run inside ``async with lifespan():``
+    (or await aclose() on shutdown) so pooled connections are released.
+    """
+    try:
+        yield _get_client()
+    finally:
+        await aclose()
+
 async def fetch_facilities(query: str = None):
     params = {"q": query} if query else {}
-    headers = {"Authorization": f"Token {API_KEY}"}
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{BASE_URL}/facilities", params=params, headers=headers)
-        response.raise_for_status()
-        return response.json()
\ No newline at end of file
+    response = await _get_client().get("/facilities", params=params)
+    response.raise_for_status()
+    return response.json()
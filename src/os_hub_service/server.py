@@ -1,9 +1,12 @@
 import os
-import json
+import asyncio
 import logging
-from typing import Any
+from urllib.parse import quote
+from typing import Any, Awaitable, Callable
 
 import aiohttp
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from mcp.server import Server
 from mcp.types import (
@@ -14,13 +17,23 @@ from mcp.types import (
     TextContent
 )
 from mcp.server.stdio import stdio_server
+from yarl import URL
+
+try:
+    import uvloop
+except ImportError:  # Not available on Windows
+    uvloop = None
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)  # Set to DEBUG for detailed logs
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # Set LOG_LEVEL=DEBUG for detailed logs
+_log_level = logging.getLevelName(LOG_LEVEL)
+logging.basicConfig(level=_log_level if isinstance(_log_level, int) else logging.INFO)
 logger = logging.getLogger("os_hub_service")
+if not isinstance(_log_level, int):
+    logger.warning("Unknown LOG_LEVEL %r, falling back to INFO", LOG_LEVEL)
 
 # API configuration
 API_KEY = os.getenv("OPEN_SUPPLY_HUB_API_KEY")
@@ -28,154 +41,356 @@ if not API_KEY:
     raise ValueError("OPEN_SUPPLY_HUB_API_KEY environment variable required")
 
 API_BASE_URL = "https://staging.opensupplyhub.org/api/facilities"
+_API_BASE = URL(API_BASE_URL)
+
+# Optional persistent cache for facility details (OSHUB_DISK_CACHE=1)
+DISK_CACHE_ENABLED = os.getenv("OSHUB_DISK_CACHE") == "1"
+DISK_CACHE_DIR = os.getenv("OSHUB_DISK_CACHE_DIR", "/var/tmp/oshub_cache")
+DISK_CACHE_TTL = 86400
+
+# Request handling concurrency for the stdio loop
+MAX_QUEUED_REQUESTS = 256
+REQUEST_WORKERS = 8
+
+def _text(text: str) -> TextContent:
+    """Build a text content block without re-validating it."""
+    return TextContent.model_construct(type="text", text=text)
+
+# Capabilities advertised on initialize
+_CAPABILITIES = {
+    "tools": {
+        "search_facilities": {
+            "description": "Search for facilities by query in Open Supply Hub.",
+            "command": "search_facilities"
+        }
+    },
+    "resources": {},  # Empty object if no resources
+    "prompts": {
+        "example_prompt": {
+            "description": "An example prompt",
+            "options": ["option1", "option2"]
+        }
+    }
+}
 
 class OSHubServer(Server):
     def __init__(self, name: str):
         super().__init__(name)
         self._initialized = False
+        self._session: aiohttp.ClientSession | None = None
+        self._probe_task: asyncio.Task | None = None
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self._search_cache: TTLCache = TTLCache(maxsize=512, ttl=60)
+        self._facility_cache: TTLCache = TTLCache(maxsize=512, ttl=60)
+        self._disk_cache = None
+        if DISK_CACHE_ENABLED:
+            from diskcache import Cache
+            self._disk_cache = Cache(DISK_CACHE_DIR, size_limit=1 << 30)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"Accept-Encoding": "gzip", "Authorization": f"Token {API_KEY}"},
+                auto_decompress=True,
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60),
+            )
+        return self._session
+
+    async def aclose(self):
+        """Close the shared HTTP session."""
+        if self._probe_task is not None and not self._probe_task.done():
+            self._probe_task.cancel()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._disk_cache is not None:
+            self._disk_cache.close()
+
+    def _clear_cache(self):
+        """Drop all cached upstream responses."""
+        self._search_cache.clear()
+        self._facility_cache.clear()
+        if self._disk_cache is not None:
+            self._disk_cache.clear()  # Rare admin path; blocking is acceptable here
+
+    async def _cached(self, cache: TTLCache, key: tuple[str, str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve from cache, otherwise fetch once (coalesced) and store the result."""
+        data = cache.get(key[1])
+        if data is not None:
+            return data
+
+        async def fetch_and_store():
+            result = await fetch()
+            cache[key[1]] = result
+            return result
+
+        return await self._coalesce(key, fetch_and_store)
+
+    async def _coalesce(self, key: tuple[str, str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Share one in-flight upstream call between concurrent identical requests."""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await fetch()
+        except asyncio.CancelledError:
+            # Fail waiters rather than cancelling them; only this caller was cancelled
+            future.set_exception(RuntimeError("Upstream request was cancelled"))
+            future.exception()  # Mark as retrieved in case nobody else was waiting
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved in case nobody else was waiting
+            raise
+        else:
+            future.set_result(data)
+            return data
+        finally:
+            del self._inflight[key]
+
+    async def _probe_upstream(self):
+        """Check the API token in the background, logging instead of raising on failure."""
+        try:
+            session = await self._get_session()
+            async with session.get(
+                _API_BASE, params={"q": "test"}, timeout=aiohttp.ClientTimeout(total=2)
+            ) as response:
+                if response.status != 200:
+                    logger.warning("Upstream probe failed: %s", response.status)
+        except Exception as e:
+            logger.warning("Upstream probe failed: %s", e)
 
     async def initialize(self, options) -> dict:
         """Handle server initialization"""
         logger.info("Starting initialization...")
-        try:
-            # Test API connection
-            headers = {"Authorization": f"Token {API_KEY}"}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{API_BASE_URL}?q=test", headers=headers) as response:
-                    if response.status != 200:
-                        raise RuntimeError(f"Failed to fetch data: {response.status}")
-            
-            self._initialized = True
-            logger.info("Server initialization complete")
-            
-            # Return initialization result with detailed capabilities
-            return {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {
-                    "tools": {
-                        "search_facilities": {
-                            "description": "Search for facilities by query in Open Supply Hub.",
-                            "command": "search_facilities"
-                        }
-                    },
-                    "resources": {},  # Empty object if no resources
-                    "prompts": {
-                        "example_prompt": {
-                            "description": "An example prompt",
-                            "options": ["option1", "option2"]
-                        }
-                    }
-                },
-                "serverInfo": {
-                    "name": self.name,
-                    "version": "1.0.0"
-                }
+        self._initialized = True
+        # Probe the API without blocking startup; real errors surface on the first tool call
+        self._probe_task = asyncio.create_task(self._probe_upstream())
+        logger.info("Server initialization complete")
+
+        # Return initialization result with detailed capabilities
+        return {
+            "protocolVersion": "2024-11-05",
+            "capabilities": _CAPABILITIES,
+            "serverInfo": {
+                "name": self.name,
+                "version": "1.0.0"
             }
-        except Exception as e:
-            logger.error(f"Initialization failed: {e}")
-            raise
+        }
+
+    async def fetch_facilities(self, query: str, raw: bool = False) -> dict[str, Any] | bytes:
+        """Fetch facilities data from Open Supply Hub API.
 
-    async def fetch_facilities(self, query: str) -> dict[str, Any]:
-        """Fetch facilities data from Open Supply Hub API."""
+        With ``raw=True`` the upstream JSON body is returned as bytes without parsing.
+        """
         if not self._initialized:
             raise RuntimeError("Server is not initialized")
-        
-        logger.debug(f"Fetching facilities with query: {query}")
-        headers = {"Authorization": f"Token {API_KEY}"}
-        url = f"{API_BASE_URL}?q={query}"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                logger.debug(f"Received response: {response.status}")
-                if response.status != 200:
-                    raise RuntimeError(f"Failed to fetch data: {response.status}")
-                data = await response.json()
-                logger.debug(f"Response JSON: {data}")
-                return data
+        body = await self._cached(self._search_cache, ("q", query), lambda: self._request_facilities(query))
+        return body if raw else orjson.loads(body)
+
+    async def _request_facilities(self, query: str) -> bytes:
+        logger.debug("Fetching facilities with query: %s", query)
+        session = await self._get_session()
+        async with session.get(_API_BASE, params={"q": query}) as response:
+            logger.debug("Received response: %s", response.status)
+            if response.status != 200:
+                raise RuntimeError(f"Failed to fetch data: {response.status}")
+            body = await response.read()
+            logger.debug("Response body: %d bytes", len(body))
+            return body
             
-    async def fetch_facility_by_id(self, os_id: str) -> dict[str, Any]:
-        """Fetch detailed information for a specific facility by OS ID."""
+    async def fetch_facility_by_id(self, os_id: str, raw: bool = False) -> dict[str, Any] | bytes:
+        """Fetch detailed information for a specific facility by OS ID.
+
+        With ``raw=True`` the upstream JSON body is returned as bytes without parsing.
+        """
         if not self._initialized:
             raise RuntimeError("Server is not initialized")
-    
-        logger.debug(f"Fetching facility details for OS ID: {os_id}")
-        headers = {"Authorization": f"Token {API_KEY}"}
-        url = f"{API_BASE_URL}/{os_id}"
-    
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                logger.debug(f"Received response: {response.status}")
-                if response.status == 404:
-                    raise ValueError(f"Facility with OS ID {os_id} not found")
-                if response.status != 200:
-                    raise RuntimeError(f"Failed to fetch facility details: {response.status}")
-                data = await response.json()
-                logger.debug(f"Response JSON: {data}")
-                return data
+        if os_id in (".", ".."):
+            raise ValueError(f"Invalid OS ID: {os_id}")
+        body = await self._cached(self._facility_cache, ("id", os_id), lambda: self._load_facility(os_id))
+        return body if raw else orjson.loads(body)
+
+    async def _load_facility(self, os_id: str) -> bytes:
+        """Read facility details from the disk cache, falling back to the API."""
+        if self._disk_cache is None:
+            return await self._request_facility(os_id)
+        # diskcache does blocking SQLite/file I/O, so keep it off the event loop
+        body = await asyncio.to_thread(self._disk_cache.get, os_id)
+        if body is None:
+            body = await self._request_facility(os_id)
+            await asyncio.to_thread(self._disk_cache.set, os_id, body, expire=DISK_CACHE_TTL)
+        return body
+
+    async def _request_facility(self, os_id: str) -> bytes:
+        logger.debug("Fetching facility details for OS ID: %s", os_id)
+        session = await self._get_session()
+        # Encode the ID as a single path segment so it can't reach other endpoints
+        url = URL(f"{_API_BASE}/{quote(os_id, safe='')}", encoded=True)
+        async with session.get(url) as response:
+            logger.debug("Received response: %s", response.status)
+            if response.status == 404:
+                raise ValueError(f"Facility with OS ID {os_id} not found")
+            if response.status != 200:
+                raise RuntimeError(f"Failed to fetch facility details: {response.status}")
+            body = await response.read()
+            logger.debug("Response body: %d bytes", len(body))
+            return body
 
 # Initialize the server
 app = OSHubServer("os_hub_server")
 
+# Static tool definitions, dumped once for tools/list responses
+_TOOLS = [
+    Tool(
+        name="search_facilities",
+        description="Search for facilities by query in Open Supply Hub.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Query string to search for facilities."
+                }
+            },
+            "required": ["query"]
+        },
+    ),
+    Tool(
+        name="get_facility_details",
+        description="Get detailed information for a specific facility by OS ID.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "os_id": {
+                    "type": "string",
+                    "description": "The Open Supply Hub ID of the facility (e.g., GB123)."
+                }
+            },
+            "required": ["os_id"]
+        },
+    )
+]
+# Dumped in JSON mode without nulls, so each frame serializes plain JSON types only
+_TOOLS_DUMPED = {
+    "tools": [tool.model_dump(mode="json", by_alias=True, exclude_none=True) for tool in _TOOLS]
+}
+
+# Static initialize result sent by the stdio loop
+_INIT_RESULT = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": _CAPABILITIES,
+    "serverInfo": {"name": "opensupplyhub-server", "version": "0.1.0"},
+}
+
 @app.list_tools()
 async def list_tools() -> list[Tool]:
     """List available tools."""
-    return [
-        Tool(
-            name="search_facilities",
-            description="Search for facilities by query in Open Supply Hub.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Query string to search for facilities."
-                    }
-                },
-                "required": ["query"]
-            },
-        ),
-        Tool(
-            name="get_facility_details",
-            description="Get detailed information for a specific facility by OS ID.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "os_id": {
-                        "type": "string",
-                        "description": "The Open Supply Hub ID of the facility (e.g., GB123)."
-                    }
-                },
-                "required": ["os_id"]
-            },
-        )
-    ]
+    return _TOOLS
+
+async def _search_facilities(arguments: dict[str, Any]) -> list[TextContent]:
+    query = arguments.get("query", "")
+    if not query:
+        raise ValueError("Missing 'query' in arguments.")
+    body = await app.fetch_facilities(query, raw=True)
+    return [_text(body.decode("utf-8"))]
+
+async def _get_facility_details(arguments: dict[str, Any]) -> list[TextContent]:
+    os_id = arguments.get("os_id", "")
+    if not os_id:
+        raise ValueError("Missing 'os_id' in arguments.")
+    try:
+        body = await app.fetch_facility_by_id(os_id, raw=True)
+        return [_text(body.decode("utf-8"))]
+    except ValueError as e:
+        # Handle not found case
+        return [_text(str(e))]
+    except Exception as e:
+        # Handle other errors
+        raise RuntimeError(f"Error fetching facility details: {str(e)}")
+
+_TOOL_HANDLERS: dict[str, Callable[[dict[str, Any]], Awaitable[list[TextContent]]]] = {
+    "search_facilities": _search_facilities,
+    "get_facility_details": _get_facility_details,
+}
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
     """Handle tool calls."""
-    if name == "search_facilities":
-        query = arguments.get("query", "")
-        if not query:
-            raise ValueError("Missing 'query' in arguments.")
-        data = await app.fetch_facilities(query)
-        return [TextContent(type="text", text=json.dumps(data, indent=2))]
-    
-    elif name == "get_facility_details":
-        os_id = arguments.get("os_id", "")
-        if not os_id:
-            raise ValueError("Missing 'os_id' in arguments.")
+    handler = _TOOL_HANDLERS.get(name)
+    if handler is None:
+        raise ValueError(f"Unknown tool: {name}")
+    return await handler(arguments)
+
+async def _handle_initialize(root: JSONRPCRequest, send: Callable[[Any], Awaitable[None]]):
+    logger.debug("Initialization method received. Preparing response...")
+    response = JSONRPCResponse.model_construct(
+        jsonrpc="2.0",
+        id=root.id,
+        result=_INIT_RESULT,
+    )
+    app._initialized = True
+    await send(response)
+    logger.debug("Initialization response sent.")
+
+async def _handle_tools_list(root: JSONRPCRequest, send: Callable[[Any], Awaitable[None]]):
+    logger.debug("Handling tools/list method")
+    response = JSONRPCResponse.model_construct(
+        jsonrpc="2.0",
+        id=root.id,
+        result=_TOOLS_DUMPED
+    )
+    await send(response)
+
+async def _handle_tools_call(root: JSONRPCRequest, send: Callable[[Any], Awaitable[None]]):
+    logger.debug("Handling tools/call method")
+    try:
+        result = await call_tool(
+            root.params["name"],
+            root.params.get("arguments", {})
+        )
+        response = JSONRPCResponse.model_construct(
+            jsonrpc="2.0",
+            id=root.id,
+            result={"content": [{"type": "text", "text": content.text} for content in result]}
+        )
+        await send(response)
+    except Exception as e:
+        error_response = JSONRPCError(
+            jsonrpc="2.0",
+            id=root.id,
+            error={"code": -32603, "message": str(e)}
+        )
+        await send(error_response)
+
+_METHOD_HANDLERS: dict[str, Callable[[JSONRPCRequest, Callable[[Any], Awaitable[None]]], Awaitable[None]]] = {
+    "initialize": _handle_initialize,
+    "tools/list": _handle_tools_list,
+    "tools/call": _handle_tools_call,
+}
+
+async def _handle_request(root: JSONRPCRequest, send: Callable[[Any], Awaitable[None]]):
+    """Dispatch a single JSON-RPC request and send its response."""
+    handler = _METHOD_HANDLERS.get(root.method)
+    if handler is None:
+        logger.debug("Ignoring unsupported method: %s", root.method)
+        return
+    await handler(root, send)
+
+async def _worker(queue: asyncio.Queue, send: Callable[[Any], Awaitable[None]]):
+    """Handle queued requests until cancelled."""
+    while True:
+        root = await queue.get()
         try:
-            data = await app.fetch_facility_by_id(os_id)
-            return [TextContent(type="text", text=json.dumps(data, indent=2))]
-        except ValueError as e:
-            # Handle not found case
-            return [TextContent(type="text", text=str(e))]
+            await _handle_request(root, send)
         except Exception as e:
-            # Handle other errors
-            raise RuntimeError(f"Error fetching facility details: {str(e)}")
-    
-    else:
-        raise ValueError(f"Unknown tool: {name}")
+            logger.error("Error handling request %s: %s", root.id, e, exc_info=True)
+        finally:
+            queue.task_done()
 
 async def main():
     """Async main entry point"""
@@ -183,85 +398,48 @@ async def main():
     try:
         async with stdio_server() as (read_stream, write_stream):
             logger.debug("stdio_server initialized and awaiting input")
-            
+            write_lock = asyncio.Lock()
+
+            async def send(response):
+                async with write_lock:
+                    await write_stream.send(response)
+
+            # Bounded queue gives backpressure; workers let slow upstream calls overlap
+            queue: asyncio.Queue[JSONRPCRequest] = asyncio.Queue(maxsize=MAX_QUEUED_REQUESTS)
+            workers = [asyncio.create_task(_worker(queue, send)) for _ in range(REQUEST_WORKERS)]
+
             try:
                 async for message in read_stream:
-                    logger.debug(f"Parsed message received: {message}")
-                    logger.debug(f"Type hierarchy for message: {type(message).mro()}")
+                    logger.debug("Parsed message received: %s", message)
 
-                    root = message.root if hasattr(message, "root") else None
+                    root = getattr(message, "root", None)
                     
                     if isinstance(root, JSONRPCRequest):
-                        logger.debug(f"Handling JSONRPCRequest: {root}")
-                        
-                        if root.method == "initialize":
-                            logger.debug("Initialization method received. Preparing response...")
-                            response = JSONRPCResponse(
-                                jsonrpc="2.0",
-                                id=root.id,
-                                result={
-                                    "protocolVersion": "2024-11-05",
-                                    "capabilities": {
-                                        "tools": {
-                                            "search_facilities": {
-                                                "description": "Search for facilities by query in Open Supply Hub.",
-                                                "command": "search_facilities"
-                                            }
-                                        },
-                                        "resources": {},  # Should be an object
-                                        "prompts": {
-                                            "example_prompt": {
-                                                "description": "An example prompt",
-                                                "options": ["option1", "option2"]
-                                            }
-                                        }
-                                    },
-                                    "serverInfo": {"name": "opensupplyhub-server", "version": "0.1.0"},
-                                },
-                            )
-                            await write_stream.send(response)
-                            logger.debug("Initialization response sent.")
-                            app._initialized = True
-                            
-                        elif root.method == "tools/list":
-                            logger.debug("Handling tools/list method")
-                            tools = await list_tools()
-                            response = JSONRPCResponse(
-                                jsonrpc="2.0",
-                                id=root.id,
-                                result={"tools": [tool.model_dump() for tool in tools]}
-                            )
-                            await write_stream.send(response)
-                            
-                        elif root.method == "tools/call":
-                            logger.debug("Handling tools/call method")
-                            try:
-                                result = await call_tool(
-                                    root.params["name"],
-                                    root.params.get("arguments", {})
-                                )
-                                response = JSONRPCResponse(
-                                    jsonrpc="2.0",
-                                    id=root.id,
-                                    result={"content": [content.model_dump() for content in result]}
-                                )
-                                await write_stream.send(response)
-                            except Exception as e:
-                                error_response = JSONRPCError(
-                                    jsonrpc="2.0",
-                                    id=root.id,
-                                    error={"code": -32603, "message": str(e)}
-                                )
-                                await write_stream.send(error_response)
+                        logger.debug("Handling JSONRPCRequest: %s", root)
+                        await queue.put(root)
+
+                await queue.join()
                     
             except Exception as e:
-                logger.error(f"Error reading input: {e}", exc_info=True)
+                logger.error("Error reading input: %s", e, exc_info=True)
                 raise
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
             
     except Exception as e:
-        logger.error(f"Server error: {e}", exc_info=True)
+        logger.error("Server error: %s", e, exc_info=True)
         raise
+    finally:
+        await app.aclose()
+
+def run():
+    """Run the server, on uvloop when it is installed."""
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
+    run()